@@ -6,8 +6,6 @@ from keras.models import model_from_json
 from keras.utils import np_utils, generic_utils
 import numpy
 import os
-import pickle
-import random
 
 import keras
 from keras.preprocessing.image import ImageDataGenerator
@@ -15,52 +13,34 @@ from keras.layers import Dense, Dropout, Activation, Flatten
 from keras.layers import Conv2D, MaxPooling2D
 
 import cifar10
-
-def go(array):
-    return loaded_model.predict(
-        numpy.array(array).reshape((1, 32, 32, 3)))[0][1]
+import evolution
+import search_state
 
 # load json and create model
-json_file = open("model.json", "r")
-loaded_model_json = json_file.read()
-json_file.close()
-loaded_model = model_from_json(loaded_model_json)
-# load weights into new model
-loaded_model.load_weights("model.hdf5")
+loaded_model = evolution.load_model("model.json", "model.hdf5")
 print("Loaded model from disk")
 
 tolerance = 0.999999
 mutation_rate = 0.001
 num_children = 50
-generation = 0
-with open('outfile', 'rb') as fp:
-    parent = pickle.load(fp)
-best_child = parent[:]
-current_best = go(parent)
+state = search_state.load_state('outfile')
+parent = state['image']
+
+# each generation's children are scored together in one predict call
+fitness = evolution.batch_fitness(loaded_model)
+search = evolution.Evolution(fitness, parent, num_children, mutation_rate)
+search.restore(state)
 
-print("The current best is " + str(100 * current_best) + "%.")
+print("The current best is " + str(100 * search.best_score) + "%.")
 
-children = [[0 for f in range(3072)] for i in range(num_children)] 
 
-while current_best < tolerance:
-    for i in range(num_children):
-        for j in range(3072):
-            if random.random() < mutation_rate or i == 0:
-                children[i][j] = int(256 * random.random())
-            else:
-                children[i][j] = parent[j]
-        result = go(children[i])
-        if result > current_best:
-            current_best = result
-            best_child = children[i][:]
-    
-    generation += 1
-    if generation == 1:
-        print("After " + str(generation) + " generation, best is "
-            + str(100 * current_best) + "%.")
+def report(search):
+    if search.generation == 1:
+        print("After " + str(search.generation) + " generation, best is "
+            + str(100 * search.best_score) + "%.")
     else:
-        print("After " + str(generation) + " generations, best is "
-            + str(100 * current_best) + "%.")
-    with open('outfile', 'wb') as fp:
-        pickle.dump(best_child, fp)
-    parent = best_child[:]
\ No newline at end of file
+        print("After " + str(search.generation) + " generations, best is "
+            + str(100 * search.best_score) + "%.")
+    search.save('outfile')
+
+search.run(tolerance, report)
@@ -0,0 +1,360 @@
+"""Searches for images that the CIFAR-10 model puts in a class.
+
+Every generation mutates the current best image into a population of
+children, scores the whole population with a single batched `predict`
+call and keeps the best child if it beats its parent. Populations are
+`(num_children, 3072)` uint8 arrays and are mutated with a few array
+operations. The scripts in this directory (`big_genetic.py`, `genetic.py`,
+`compiled.py`, `sloth.py`) only differ in how pixels are scaled for the
+model, how children are mutated and where the image is stored.
+
+With the model's weights at hand, `GradientAscent` is the white-box
+alternative: it follows the sign of the gradient of the target class with
+respect to the pixels, one backward pass per step (`white_box.py`).
+`CoordinateSearch` stays black-box and probes every pixel by one grey level
+in either direction, scoring the probes in large batches (`slothier.py`).
+
+Every search can be checkpointed with `save` and resumed with `restore`
+(see `search_state`).
+"""
+from __future__ import print_function
+
+import os
+
+import numpy
+from keras import backend as K
+from keras.models import model_from_json
+
+from search_state import save_state
+
+image_shape = (32, 32, 3)
+image_size = 32 * 32 * 3
+
+# probe batches are sized to use at most this share of the free memory
+probe_memory_fraction = 0.25
+
+
+def load_model(json_name="model.json", weights_name="model.hdf5"):
+    """Rebuild the CIFAR-10 model from its JSON architecture and weights."""
+    with open(json_name, "r") as json_file:
+        model = model_from_json(json_file.read())
+    model.load_weights(weights_name)
+    return model
+
+
+def batch_fitness(model, target=1, scale=1.0):
+    """Return a function scoring a population in one `predict` call.
+
+    The returned function takes a `(population, 3072)` array of pixel values
+    and returns the model's probability of class `target` for every image,
+    after multiplying the pixels by `scale` (`1. / 255` for models trained on
+    normalised images).
+    """
+    def fitness(population):
+        x = numpy.asarray(population, dtype="float32").reshape(
+            (-1,) + image_shape)
+        if scale != 1.0:
+            x *= scale
+        return model.predict(x, batch_size=len(x))[:, target]
+    return fitness
+
+
+def mutate_rate(parent, num_children, rng, mutation_rate=0.001):
+    """Children of `parent`, each pixel redrawn with `mutation_rate`.
+
+    The first child is redrawn entirely, so every generation also tries a
+    random image.
+    """
+    children = numpy.repeat(parent[None], num_children, axis=0)
+    mask = rng.random_sample(children.shape) < mutation_rate
+    mask[0] = True
+    children[mask] = rng.randint(0, 256, numpy.count_nonzero(mask))
+    return children
+
+
+def mutate_zap(parent, num_children, rng, mutation_rate=None):
+    """Children of `parent` that each have one random pixel redrawn.
+
+    As with `mutate_rate`, the first child is redrawn entirely.
+    `mutation_rate` is ignored.
+    """
+    children = numpy.repeat(parent[None], num_children, axis=0)
+    children[numpy.arange(num_children),
+             rng.randint(0, image_size, num_children)] = rng.randint(
+                 0, 256, num_children)
+    children[0] = rng.randint(0, 256, image_size)
+    return children
+
+
+mutations = {"rate": mutate_rate, "zap": mutate_zap}
+
+
+def gradient_function(model, target=1, scale=1.0):
+    """Return a function scoring a population together with its gradients.
+
+    The returned function takes a `(population, 3072)` array of pixel values
+    and returns the probability of class `target` for every image and the
+    gradient of its log with respect to the pixels, as `(population, 3072)`.
+    The log keeps the gradient from vanishing once the probability is close
+    to 0 or 1.
+    """
+    probability = model.output[:, target]
+    gradient = K.gradients(K.log(probability + K.epsilon()), model.input)[0]
+    run = K.function([model.input, K.learning_phase()],
+                     [probability, gradient])
+
+    def evaluate(population):
+        x = numpy.asarray(population, dtype="float32").reshape(
+            (-1,) + image_shape)
+        if scale != 1.0:
+            x *= scale
+        scores, gradients = run([x, 0])
+        return scores, gradients.reshape((len(x), image_size)) * scale
+    return evaluate
+
+
+def probe_chunk_size(model, memory_fraction=probe_memory_fraction,
+                     minimum=64, maximum=2 * image_size):
+    """Number of probe images to score per `predict` call.
+
+    Each image costs its float32 input plus the float32 outputs of every
+    layer of `model`; as many images are taken as fit in `memory_fraction`
+    of the memory that is currently free, within `[minimum, maximum]`.
+    """
+    per_image = 4 * image_size + 4 * sum(
+        int(numpy.prod(layer.output_shape[1:])) for layer in model.layers)
+    try:
+        free = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return minimum
+    return int(min(maximum, max(minimum, memory_fraction * free // per_image)))
+
+
+class Search(object):
+    """Common driver of the searches.
+
+    Subclasses keep the best image in `best`, its score in `best_score` and
+    count steps in `generation`; `history` is the best score after every
+    step taken by `run`.
+    """
+
+    def step(self):
+        raise NotImplementedError
+
+    def state(self):
+        """The arrays that `save` writes."""
+        return {"image": self.best.reshape(image_shape),
+                "score": numpy.float64(self.best_score),
+                "generation": numpy.int64(self.generation),
+                "history": numpy.array(self.history, dtype="float64")}
+
+    def restore(self, state):
+        """Carry on from a state read with `search_state.load_state`."""
+        self.generation = int(state.get("generation", 0))
+        self.history = [float(score) for score in state.get("history", [])]
+
+    def save(self, filename):
+        """Atomically checkpoint the search to `filename`."""
+        save_state(filename, **self.state())
+
+    def run(self, tolerance=0.999999, callback=None):
+        """Step until the best score reaches `tolerance`.
+
+        `callback(self)` is called after every generation.
+        """
+        while self.best_score < tolerance:
+            self.step()
+            self.history.append(self.best_score)
+            if callback is not None:
+                callback(self)
+        return self.best
+
+
+class Evolution(Search):
+    """Hill-climbing search over images with batched fitness evaluation.
+
+    # Arguments
+        fitness: function from a `(population, 3072)` array to one score
+            per image, e.g. from `batch_fitness`.
+        parent: the starting image, 3072 pixel values.
+        num_children: population size of each generation.
+        mutation_rate: probability of redrawing each pixel of a child.
+        mutation: name of a strategy in `mutations`, or a function with
+            the same signature as `mutate_rate`.
+        rng: `numpy.random.RandomState` drawing all mutations.
+    """
+
+    def __init__(self, fitness, parent, num_children=50, mutation_rate=0.001,
+                 mutation="rate", rng=None):
+        self.fitness = fitness
+        self.num_children = num_children
+        self.mutation_rate = mutation_rate
+        if not callable(mutation):
+            mutation = mutations[mutation]
+        self.mutate = mutation
+        self.rng = rng if rng is not None else numpy.random.RandomState()
+        self.best = numpy.array(parent, dtype="uint8").reshape((image_size,))
+        self.population = self.best[None]
+        self.best_score = float(fitness(self.population)[0])
+        self.generation = 0
+        self.history = []
+
+    def state(self):
+        state = super(Evolution, self).state()
+        name, keys, pos, has_gauss, cached_gaussian = self.rng.get_state()
+        state.update(population=self.population, rng_keys=keys,
+                     rng_pos=pos, rng_has_gauss=has_gauss,
+                     rng_cached_gaussian=cached_gaussian)
+        return state
+
+    def restore(self, state):
+        super(Evolution, self).restore(state)
+        if "rng_keys" in state:
+            self.rng.set_state(("MT19937", state["rng_keys"],
+                                int(state["rng_pos"]),
+                                int(state["rng_has_gauss"]),
+                                float(state["rng_cached_gaussian"])))
+
+    def step(self):
+        """Run one generation; return whether the best image improved."""
+        children = self.mutate(self.best, self.num_children, self.rng,
+                               self.mutation_rate)
+        self.population = children
+        scores = self.fitness(children)
+        i = int(numpy.argmax(scores))
+        self.generation += 1
+        if scores[i] > self.best_score:
+            self.best_score = float(scores[i])
+            self.best = children[i].copy()
+            return True
+        return False
+
+
+class GradientAscent(Search):
+    """Signed-gradient ascent on the pixels of an image.
+
+    Every step moves each pixel by `step_size` in the direction that raises
+    the target probability, clips to [0, 255] and scores the rounded uint8
+    image, whose gradient gives the next step. The pixels are tracked as
+    floats so that steps smaller than one grey level add up.
+
+    # Arguments
+        gradient: function from a `(population, 3072)` array to scores and
+            gradients, e.g. from `gradient_function`.
+        parent: the starting image, 3072 pixel values.
+        step_size: change of each pixel per step, in grey levels.
+    """
+
+    def __init__(self, gradient, parent, step_size=1.0):
+        self.gradient = gradient
+        self.step_size = step_size
+        self.pixels = numpy.array(parent, dtype="float32").reshape(
+            (image_size,))
+        self.best = numpy.rint(self.pixels).astype("uint8")
+        scores, gradients = gradient(self.best[None])
+        self.best_score = float(scores[0])
+        self._direction = numpy.sign(gradients[0])
+        self.generation = 0
+        self.history = []
+
+    def state(self):
+        state = super(GradientAscent, self).state()
+        state["pixels"] = self.pixels
+        return state
+
+    def restore(self, state):
+        super(GradientAscent, self).restore(state)
+        if "pixels" in state:
+            self.pixels = numpy.array(state["pixels"], dtype="float32")
+            scores, gradients = self.gradient(
+                numpy.rint(self.pixels).astype("uint8")[None])
+            self._direction = numpy.sign(gradients[0])
+
+    def step(self):
+        """Take one step; return whether the best image improved."""
+        self.pixels += self.step_size * self._direction
+        numpy.clip(self.pixels, 0, 255, out=self.pixels)
+        image = numpy.rint(self.pixels).astype("uint8")
+        scores, gradients = self.gradient(image[None])
+        self._direction = numpy.sign(gradients[0])
+        self.generation += 1
+        if scores[0] > self.best_score:
+            self.best_score = float(scores[0])
+            self.best = image
+            return True
+        return False
+
+
+class CoordinateSearch(Search):
+    """Black-box coordinate ascent with batched finite differences.
+
+    A sweep raises and lowers every pixel of the best image by `delta` and
+    scores those probes in batches of `chunk_size` images. For the pixels of
+    a batch whose probe beat the best image, the best 1, 2, 4, ... of those
+    changes are applied together and scored in one more batch, and the best
+    of these images (if it improves) becomes the base of the next batch.
+
+    # Arguments
+        fitness: function from a `(population, 3072)` array to one score
+            per image, e.g. from `batch_fitness`.
+        parent: the starting image, 3072 pixel values.
+        delta: change of a pixel per probe, in grey levels.
+        chunk_size: probe images per batch, e.g. from `probe_chunk_size`.
+    """
+
+    def __init__(self, fitness, parent, delta=1, chunk_size=2 * image_size):
+        self.fitness = fitness
+        self.delta = delta
+        self.chunk_size = max(2, chunk_size)
+        self.best = numpy.array(parent, dtype="uint8").reshape((image_size,))
+        self.best_score = float(fitness(self.best[None])[0])
+        self.generation = 0
+        self.history = []
+
+    def _probe(self, pixels):
+        """Lower and raise each of `pixels` on its own.
+
+        Returns the scores and the new pixel values, both `(2, len(pixels))`
+        with the lowered probes first.
+        """
+        n = len(pixels)
+        old = self.best[pixels].astype("int16")
+        values = numpy.clip([old - self.delta, old + self.delta],
+                            0, 255).astype("uint8")
+        probes = numpy.repeat(self.best[None], 2 * n, axis=0)
+        rows = numpy.arange(n)
+        probes[rows, pixels] = values[0]
+        probes[n + rows, pixels] = values[1]
+        return self.fitness(probes).reshape((2, n)), values
+
+    def step(self):
+        """Run one sweep; return whether the best image improved."""
+        improved = False
+        per_chunk = self.chunk_size // 2
+        for start in range(0, image_size, per_chunk):
+            pixels = numpy.arange(start, min(start + per_chunk, image_size))
+            scores, values = self._probe(pixels)
+            direction = numpy.argmax(scores, axis=0)
+            columns = numpy.arange(len(pixels))
+            gain = scores[direction, columns]
+            change = values[direction, columns]
+            order = numpy.argsort(-gain)
+            order = order[gain[order] > self.best_score]
+            if not len(order):
+                continue
+
+            # apply the top 1, 2, 4, ... changes and keep the best image
+            counts = sorted(set([2 ** i for i in range(
+                int(numpy.log2(len(order))) + 1)] + [len(order)]))
+            candidates = numpy.repeat(self.best[None], len(counts), axis=0)
+            for row, count in enumerate(counts):
+                chosen = order[:count]
+                candidates[row, pixels[chosen]] = change[chosen]
+            candidate_scores = self.fitness(candidates)
+            i = int(numpy.argmax(candidate_scores))
+            if candidate_scores[i] > self.best_score:
+                self.best_score = float(candidate_scores[i])
+                self.best = candidates[i].copy()
+                improved = True
+        self.generation += 1
+        return improved
@@ -1,19 +1,8 @@
-import pickle
-import numpy
 from PIL import Image
 
-with open('outfile', 'rb') as fp:
-	array = pickle.load(fp)
+import search_state
 
-array = numpy.reshape(array, (32, 32, 3))
-array = 1.0 * array
-array /= 256
-r = array[:, :, 0]
-g = array[:, :, 1]
-b = array[:, :, 2]
-rgb = numpy.zeros((32, 32, 3), 'uint8')
-rgb[..., 0] = r * 256
-rgb[..., 1] = g * 256
-rgb[..., 2] = b * 256
-img = Image.fromarray(rgb)
-img.save('output.png')
\ No newline at end of file
+state = search_state.load_state('outfile')
+
+img = Image.fromarray(state['image'])
+img.save('output.png')
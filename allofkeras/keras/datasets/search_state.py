@@ -0,0 +1,40 @@
+"""Binary checkpoints of the image searches.
+
+A state is a set of named arrays (the best image as `(32, 32, 3)` uint8,
+its score, the score history and whatever else a search needs to resume)
+stored with `numpy.savez`. It is written to a temporary file and renamed
+over the old checkpoint, so an interrupted write leaves the previous one
+intact. Checkpoints of older runs, pickled lists of 3072 ints, can still
+be read.
+"""
+import os
+import pickle
+
+import numpy
+
+image_shape = (32, 32, 3)
+
+
+def save_state(filename, **state):
+    """Atomically replace `filename` with the arrays in `state`."""
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as f:
+        numpy.savez(f, **state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def load_state(filename):
+    """Return the arrays saved in `filename` as a dict.
+
+    For a pickled list of pixel values, the dict only holds the `image`.
+    """
+    with open(filename, "rb") as f:
+        if f.read(2) == b"PK":
+            f.seek(0)
+            with numpy.load(f) as archive:
+                return dict((name, archive[name]) for name in archive.files)
+        f.seek(0)
+        pixels = pickle.load(f)
+    return {"image": numpy.array(pixels, dtype="uint8").reshape(image_shape)}
@@ -6,8 +6,6 @@ from keras.models import model_from_json
 from keras.utils import np_utils, generic_utils
 import numpy
 import os
-import pickle
-import random
 
 import keras
 from keras.preprocessing.image import ImageDataGenerator
@@ -15,18 +13,11 @@ from keras.layers import Dense, Dropout, Activation, Flatten
 from keras.layers import Conv2D, MaxPooling2D
 
 import cifar10
-
-def go(array):
-    return loaded_model.predict(
-        numpy.array(array).reshape((1, 32, 32, 3)))[0][1]
+import evolution
+import search_state
 
 # load json and create model
-json_file = open("model.json", "r")
-loaded_model_json = json_file.read()
-json_file.close()
-loaded_model = model_from_json(loaded_model_json)
-# load weights into new model
-loaded_model.load_weights("model.hdf5")
+loaded_model = evolution.load_model("model.json", "model.hdf5")
 print("Loaded model from disk")
 
 # initiate RMSprop optimizer
@@ -38,42 +29,27 @@ print("Loaded model from disk")
 #              metrics=['accuracy'])
 
 tolerance = 0.999999
-mutation_rate = 0.001
-num_children = 50
-generation = 0
-with open('outfile', 'rb') as fp:
-    best = pickle.load(fp)
-current_best = go(best)
+state = search_state.load_state('outfile')
+best = state['image']
+
+# the 6144 probes of a sweep are scored in as few predict calls as fit in
+# memory
+fitness = evolution.batch_fitness(loaded_model)
+chunk_size = evolution.probe_chunk_size(loaded_model)
+search = evolution.CoordinateSearch(fitness, best, chunk_size=chunk_size)
+search.restore(state)
 
-print("The current best is " + str(100 * current_best) + "%.")
+print("The current best is " + str(100 * search.best_score) + "%.")
+print("Scoring " + str(chunk_size) + " probes per batch.")
 
-while current_best < tolerance:
-    for i in range(3072):
-        if i % 64 == 0:
-            print("Done " + str(i // 64) + " out of 48 in generation "
-                + str(generation) + ".\nCurrent best is "
-                + str(100 * current_best) + "%.")
-            with open('outfile', 'wb') as fp:
-                pickle.dump(best, fp)
-        val = best[i]
-        child = best[:]
-        child[i] = max(val - 1, 0)
-        result = go(child)
-        if result > current_best:
-            current_best = result
-            best = child[:]
-        child[i] = min(val + 1, 255)
-        result = go(child)
-        if result > current_best:
-            current_best = result
-            best = child[:]
 
-    generation += 1
-    if generation == 1:
-        print("After " + str(generation) + " generation, best is "
-            + str(100 * current_best) + "%.")
+def report(search):
+    if search.generation == 1:
+        print("After " + str(search.generation) + " generation, best is "
+            + str(100 * search.best_score) + "%.")
     else:
-        print("After " + str(generation) + " generations, best is "
-            + str(100 * current_best) + "%.")
-    with open('outfile', 'wb') as fp:
-        pickle.dump(best, fp)
\ No newline at end of file
+        print("After " + str(search.generation) + " generations, best is "
+            + str(100 * search.best_score) + "%.")
+    search.save('outfile')
+
+search.run(tolerance, report)
@@ -0,0 +1,32 @@
+from __future__ import print_function
+
+import evolution
+import search_state
+
+# load json and create model
+loaded_model = evolution.load_model("model.json", "model.hdf5")
+print("Loaded model from disk")
+
+tolerance = 0.999999
+step_size = 1.0
+state = search_state.load_state('outfile')
+parent = state['image']
+
+# one forward and backward pass per step instead of a predict per pixel
+gradient = evolution.gradient_function(loaded_model)
+search = evolution.GradientAscent(gradient, parent, step_size)
+search.restore(state)
+
+print("The current best is " + str(100 * search.best_score) + "%.")
+
+
+def report(search):
+    if search.generation == 1:
+        print("After " + str(search.generation) + " step, best is "
+            + str(100 * search.best_score) + "%.")
+    else:
+        print("After " + str(search.generation) + " steps, best is "
+            + str(100 * search.best_score) + "%.")
+    search.save('outfile')
+
+search.run(tolerance, report)
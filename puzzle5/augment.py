@@ -0,0 +1,88 @@
+# On-the-fly augmentation of the letter training set. LetterSequence reads
+# batches from a packed, memory-mapped letter file (see dataset.py) and
+# shifts, rotates and adds noise to a whole batch with a few array
+# operations, so fit_generator workers are not bound by Python loops.
+
+from __future__ import print_function
+
+import keras
+import numpy as np
+
+import dataset
+
+
+def augment(x, rng, shift=2, rotation=10, noise=0.01):
+	"""Randomly shift, rotate and flip pixels of a (N, 32, 32) batch.
+
+	Every letter is rotated by up to rotation degrees around its centre and
+	shifted by up to shift pixels, with nearest-neighbour sampling, and then
+	a noise fraction of its pixels is inverted.
+	"""
+	n, h, w = x.shape
+	theta = np.deg2rad(rng.uniform(-rotation, rotation, n))[:, None, None]
+	ty = rng.randint(-shift, shift + 1, n)[:, None, None]
+	tx = rng.randint(-shift, shift + 1, n)[:, None, None]
+	cy, cx = (h - 1) / 2.0, (w - 1) / 2.0
+	yy, xx = np.mgrid[:h, :w]
+	# source pixel of every target pixel: undo the shift, then the rotation
+	dy = yy - cy - ty
+	dx = xx - cx - tx
+	sy = np.rint(np.cos(theta) * dy + np.sin(theta) * dx + cy).astype(int)
+	sx = np.rint(np.cos(theta) * dx - np.sin(theta) * dy + cx).astype(int)
+	inside = (sy >= 0) & (sy < h) & (sx >= 0) & (sx < w)
+	out = x[np.arange(n)[:, None, None], np.clip(sy, 0, h - 1),
+		np.clip(sx, 0, w - 1)] * inside
+	flip = rng.random_sample(out.shape) < noise
+	out[flip] = 1 - out[flip]
+	return out
+
+
+class LetterSequence(keras.utils.Sequence):
+	"""Batches of (letters, one-hot labels) from a packed letter file.
+
+	The file is memory-mapped lazily in each process, so the sequence can be
+	sent to multiprocessing workers without copying the data. Records are
+	visited in an order shuffled once with seed; augmentation draws fresh
+	randomness on every call so each epoch sees different letters.
+	"""
+
+	def __init__(self, npy_file, batch_size=128, num_classes=36,
+			input_shape=(32, 32, 1), augmentation=True, shift=2, rotation=10,
+			noise=0.01, seed=0):
+		self.npy_file = npy_file
+		self.batch_size = batch_size
+		self.num_classes = num_classes
+		self.input_shape = input_shape
+		self.augmentation = augmentation
+		self.shift = shift
+		self.rotation = rotation
+		self.noise = noise
+		self._data = None
+		count = len(self.data[1])
+		self.order = np.random.RandomState(seed).permutation(count)
+
+	@property
+	def data(self):
+		if self._data is None:
+			self._data = dataset.load(self.npy_file)
+		return self._data
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['_data'] = None
+		return state
+
+	def __len__(self):
+		return int(np.ceil(len(self.order) / float(self.batch_size)))
+
+	def __getitem__(self, idx):
+		x, y = self.data
+		# sorted indices keep the reads from the memory map sequential
+		index = np.sort(self.order[idx * self.batch_size:
+			(idx + 1) * self.batch_size])
+		batch_x = x[index].astype('float32') / 255
+		if self.augmentation:
+			batch_x = augment(batch_x, np.random.RandomState(), self.shift,
+				self.rotation, self.noise)
+		batch_y = keras.utils.to_categorical(y[index], self.num_classes)
+		return batch_x.reshape((len(index),) + self.input_shape), batch_y
@@ -0,0 +1,148 @@
+# Throughput benchmark for the decode -> clean -> segment -> classify
+# pipeline on a fixed set of synthetic CAPTCHAs. Reports images per second
+# and p50/p99 latency per batch for every stage and writes the numbers to a
+# JSON file so that runs can be compared.
+#
+#   python3 benchmark.py --count 2000 --output benchmark.json
+
+from __future__ import print_function
+import argparse
+import base64
+import json
+import platform
+import time
+
+import cv2
+import numpy as np
+
+import engine
+
+stages = ['decode', 'clean', 'segment', 'classify']
+
+
+def synthetic_captchas(count, seed=0, lines='clines.csv'):
+	"""Yield (name, img_data, solution) for count generated CAPTCHAs.
+
+	Four random characters are drawn in white on black at random heights
+	and spacings, the line pixels of the given file are drawn on top and
+	the result is JPEG encoded like the real CAPTCHAs.
+	"""
+	rng = np.random.RandomState(seed)
+	mask = engine.line_mask(lines)
+	for i in range(count):
+		solution = ''.join(rng.choice(engine.letter_saves, engine.num_letters))
+		img = np.zeros((engine.height, engine.width, 3), dtype='uint8')
+		x = 6 + rng.randint(0, 8)
+		for letter in solution:
+			cv2.putText(img, letter, (x, 34 + rng.randint(-5, 6)),
+				cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+			x += 20 + rng.randint(0, 4)
+		img[mask] = 255
+		jpeg = cv2.imencode('.jpg', img)[1].tobytes()
+		yield 'synthetic%06d' % i, base64.encodebytes(jpeg), solution
+
+
+def load_model(filename):
+	"""The trained classifier, or an untrained one of the same shape."""
+	if filename:
+		from inference import load_inference_model
+		return load_inference_model(filename, weights=None, cache=None)
+	import model
+	net = model.build_model()
+	net.predict(np.zeros((1,) + model.get_input_shape(), dtype='float32'))
+	return net
+
+
+def run(captchas, net, mask, batch_size, segmentation='projection'):
+	"""Time every stage of the pipeline batch by batch.
+
+	Returns a dict of per-batch durations in seconds for every stage that
+	was run; classify is left out when net is None.
+	"""
+	timings = dict((stage, []) for stage in stages)
+	for batch in engine.batches(captchas, batch_size):
+		start = time.perf_counter()
+		imgs = np.array([engine.decode(img_data) for name, img_data in batch])
+		decoded = time.perf_counter()
+		imgs = engine.remove_lines(imgs, mask)
+		cleaned = time.perf_counter()
+		letters = engine.center_crop(np.concatenate(
+			[engine.segment_letters(img, segmentation) for img in imgs]))
+		segmented = time.perf_counter()
+		if net is not None:
+			engine.classify(net, letters)
+		classified = time.perf_counter()
+
+		timings['decode'].append(decoded - start)
+		timings['clean'].append(cleaned - decoded)
+		timings['segment'].append(segmented - cleaned)
+		timings['classify'].append(classified - segmented)
+	if net is None:
+		del timings['classify']
+	return timings
+
+
+def summarize(timings, count):
+	"""Turn per-batch durations into throughput and latency figures."""
+	results = {}
+	for stage, durations in list(timings.items()) + [
+			('total', np.sum(list(timings.values()), axis=0))]:
+		durations = np.asarray(durations)
+		total = float(durations.sum())
+		results[stage] = {
+			'seconds': total,
+			'images_per_second': count / total if total else None,
+			'batch_p50_ms': float(np.percentile(durations, 50)) * 1000,
+			'batch_p99_ms': float(np.percentile(durations, 99)) * 1000,
+		}
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='Benchmark the CAPTCHA pipeline on synthetic CAPTCHAs.')
+	parser.add_argument('--count', type=int, default=2000)
+	parser.add_argument('--batch-size', type=int, default=64)
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--lines', default='clines.csv')
+	parser.add_argument('--segmentation', default='projection',
+		choices=engine.segmentation_methods)
+	parser.add_argument('--model', default=None,
+		help='trained model to time (default: an untrained copy)')
+	parser.add_argument('--no-model', action='store_true',
+		help='skip the classify stage, e.g. without keras')
+	parser.add_argument('--output', default='benchmark.json')
+	args = parser.parse_args()
+
+	captchas = [(name, img_data) for name, img_data, solution
+		in synthetic_captchas(args.count, args.seed, args.lines)]
+	net = None if args.no_model else load_model(args.model)
+	mask = engine.line_mask(args.lines)
+
+	timings = run(captchas, net, mask, args.batch_size, args.segmentation)
+	results = summarize(timings, len(captchas))
+
+	for stage in [s for s in stages if s in results] + ['total']:
+		r = results[stage]
+		print('%-9s %9.1f images/s   p50 %8.2f ms   p99 %8.2f ms  per batch'
+			% (stage, r['images_per_second'] or 0, r['batch_p50_ms'],
+			r['batch_p99_ms']))
+
+	with open(args.output, 'w') as f:
+		json.dump({
+			'count': len(captchas),
+			'batch_size': args.batch_size,
+			'seed': args.seed,
+			'segmentation': args.segmentation,
+			'model': None if args.no_model else (args.model or 'untrained'),
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'opencv': cv2.__version__,
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'stages': results,
+		}, f, indent=2, sort_keys=True)
+	print('Wrote', args.output)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,108 @@
+# Persistent cache of solved CAPTCHAs, keyed by a digest of the base64
+# payload so that repeated images skip decoding, cleaning, segmentation and
+# prediction. Backed by SQLite in WAL mode: lookups go through the primary
+# key index, and several solver processes can read and write the same file.
+
+import hashlib
+import json
+import os
+import sqlite3
+
+# SQLite builds before 3.32 allow at most 999 parameters per statement
+_chunk = 500
+
+
+def file_fingerprint(*filenames, **settings):
+	"""Identify the given files (path, size and mtime) and settings.
+
+	Missing files and None are recorded as such, so that adding or removing
+	a file also changes the fingerprint.
+	"""
+	files = []
+	for filename in filenames:
+		if filename and os.path.exists(filename):
+			stat = os.stat(filename)
+			files.append([os.path.abspath(filename), stat.st_size,
+				stat.st_mtime])
+		else:
+			files.append(filename and os.path.abspath(filename))
+	return json.dumps({'files': files, 'settings': settings}, sort_keys=True)
+
+
+class ResultCache(object):
+	"""Map img_data digests to the (text, confidence) the solver produced.
+
+	Both the best reading and its confidence are kept, including for
+	CAPTCHAs that were rejected. Without the second pass the min_confidence
+	cut-off can change without invalidating the cache; with it the reading
+	itself depends on the cut-off. Results are only meaningful for the
+	model that produced them: pass a fingerprint of everything they depend
+	on (see file_fingerprint), and a cache written under another
+	fingerprint is emptied when it is opened.
+	"""
+
+	def __init__(self, filename='solutions.db', fingerprint=None, timeout=60):
+		self.filename = filename
+		self._db = sqlite3.connect(filename, timeout=timeout,
+			isolation_level=None)
+		self._db.execute('PRAGMA journal_mode=WAL')
+		self._db.execute('PRAGMA synchronous=NORMAL')
+		self._db.execute('CREATE TABLE IF NOT EXISTS results ('
+			'key BLOB PRIMARY KEY, text TEXT NOT NULL, confidence REAL NOT NULL'
+			') WITHOUT ROWID')
+		self._db.execute('CREATE TABLE IF NOT EXISTS meta ('
+			'name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+		self.cleared = False
+		if fingerprint is not None:
+			self._check(fingerprint)
+
+	def _check(self, fingerprint):
+		"""Drop the results if they were made under another fingerprint."""
+		with self._db:
+			self._db.execute('BEGIN IMMEDIATE')
+			row = self._db.execute("SELECT value FROM meta "
+				"WHERE name = 'fingerprint'").fetchone()
+			if row is not None and row[0] == fingerprint:
+				return
+			self.cleared = self._db.execute('SELECT 1 FROM results LIMIT 1'
+				).fetchone() is not None
+			self._db.execute('DELETE FROM results')
+			self._db.execute("INSERT OR REPLACE INTO meta (name, value) "
+				"VALUES ('fingerprint', ?)", (fingerprint,))
+
+	@staticmethod
+	def key(img_data):
+		return hashlib.sha1(img_data).digest()
+
+	def get_many(self, keys):
+		"""Return a dict of key -> (text, confidence) for the cached keys."""
+		keys = list(set(keys))
+		found = {}
+		for i in range(0, len(keys), _chunk):
+			chunk = keys[i:i + _chunk]
+			found.update((key, (text, confidence)) for key, text, confidence
+				in self._db.execute('SELECT key, text, confidence FROM results '
+				'WHERE key IN (%s)' % ','.join('?' * len(chunk)), chunk))
+		return found
+
+	def put_many(self, items):
+		"""Store an iterable of (key, (text, confidence)) in one transaction."""
+		rows = [(key, text, confidence) for key, (text, confidence) in items]
+		if not rows:
+			return
+		with self._db:
+			self._db.execute('BEGIN IMMEDIATE')
+			self._db.executemany('INSERT OR REPLACE INTO results '
+				'(key, text, confidence) VALUES (?, ?, ?)', rows)
+
+	def __len__(self):
+		return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+	def close(self):
+		self._db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
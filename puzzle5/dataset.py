@@ -0,0 +1,66 @@
+# Packed letter datasets. A CSV of "label,pixel,...,pixel" rows (1024 pixels
+# of 0 or 255 per 32x32 letter) is converted once into a .npy file of
+# records holding a uint8 label and a uint8 32x32 image, which is then
+# memory-mapped so that loading is a zero-copy view of the file.
+#
+#   python3 dataset.py formatted.csv test.csv
+
+from __future__ import print_function
+import csv
+import os
+import sys
+
+import numpy as np
+
+letter_size = 32
+record = np.dtype([('label', 'uint8'),
+	('pixels', 'uint8', (letter_size, letter_size))])
+
+
+def packed_name(csv_file):
+	return os.path.splitext(csv_file)[0] + '.npy'
+
+
+def convert(csv_file, npy_file=None):
+	"""Convert a letter CSV into a packed .npy file and return its name."""
+	npy_file = npy_file or packed_name(csv_file)
+	with open(csv_file, 'r') as f:
+		count = sum(1 for line in f if line.strip())
+	tmp = npy_file + '.tmp'
+	data = np.lib.format.open_memmap(tmp, mode='w+', dtype=record,
+		shape=(count,))
+	with open(csv_file, 'r') as csvfile:
+		spamreader = csv.reader(csvfile, delimiter=',', quotechar='|')
+		for i, row in enumerate(r for r in spamreader if r):
+			data['label'][i] = int(row[0])
+			data['pixels'][i] = np.array(row[1:], dtype='uint8').reshape(
+				(letter_size, letter_size))
+	data.flush()
+	del data
+	os.replace(tmp, npy_file)
+	return npy_file
+
+
+def load(npy_file):
+	"""Memory-map a packed file and return (pixels, labels) views."""
+	data = np.load(npy_file, mmap_mode='r')
+	return data['pixels'], data['label']
+
+
+def ensure_packed(csv_file):
+	"""Return the packed file of a letter CSV, converting it if needed."""
+	npy_file = packed_name(csv_file)
+	if not os.path.exists(npy_file) or (os.path.exists(csv_file)
+			and os.path.getmtime(npy_file) < os.path.getmtime(csv_file)):
+		convert(csv_file, npy_file)
+	return npy_file
+
+
+def load_dataset(csv_file):
+	"""Load a letter CSV through its packed file, converting it if needed."""
+	return load(ensure_packed(csv_file))
+
+
+if __name__ == '__main__':
+	for csv_file in sys.argv[1:]:
+		print('Wrote', convert(csv_file))
@@ -0,0 +1,616 @@
+# In-memory CAPTCHA solving engine. Decodes, cleans and segments CAPTCHAs
+# without touching the disk and classifies the letters of a whole batch of
+# CAPTCHAs with a single call to the model.
+
+from __future__ import print_function
+import base64
+import collections
+import csv
+import itertools
+import multiprocessing
+
+import cv2
+import numpy as np
+
+letter_saves = ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m", "n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z"]
+
+num_letters = 4
+letter_size = 32
+height, width = 50, 100
+thresh = 200
+min_confidence = 0.70
+predict_batch_size = 1024
+
+# Second pass: largest number of projection runs to regroup, and how far to
+# move the split point between two touching letters
+max_runs = 7
+split_shifts = (-3, -2, -1, 1, 2, 3)
+
+# Segmentation backends, and the smallest connected component (in pixels)
+# that the components backend treats as part of a letter
+segmentation_methods = ('projection', 'components')
+min_component = 10
+
+# Test-time crops: (row, column) offsets from a letter's centre of mass of
+# the 32x32 windows that are classified and averaged, in order of use
+crop_offsets = ((0, 0), (0, -2), (0, 2), (-2, 0), (2, 0),
+	(-2, -2), (2, 2), (-2, 2), (2, -2))
+
+
+def decode(img_data):
+	"""Decode a base64 JPEG into a binary (0 or 255) grayscale image."""
+	return decode_jpeg(base64.decodebytes(img_data))
+
+
+def decode_jpeg(jpeg_bytes):
+	"""Decode JPEG bytes into a binary (0 or 255) grayscale image."""
+	buf = np.frombuffer(jpeg_bytes, dtype=np.uint8)
+	img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+	img_g = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+	return cv2.threshold(img_g, thresh, 255, cv2.THRESH_BINARY)[1]
+
+
+def read_lines(filename='clines.csv'):
+	"""Read in the position of the line pixels as (x, y) tuples."""
+	lines = []
+	with open(filename, 'r') as csvfile:
+		spamreader = csv.reader(csvfile, delimiter=' ', quotechar='|')
+		for row in spamreader:
+			x, y = row[0].split(',')
+			lines.append((int(x), int(y)))
+	return lines
+
+
+_line_masks = {}
+
+def line_mask(filename='clines.csv', shape=(height, width)):
+	"""Boolean (height, width) mask of the line pixels, parsed once per file."""
+	key = (filename, shape)
+	if key not in _line_masks:
+		mask = np.zeros(shape, dtype=bool)
+		lines = read_lines(filename)
+		if lines:
+			x, y = np.array(lines).T
+			mask[y, x] = True
+		_line_masks[key] = mask
+	return _line_masks[key]
+
+
+def remove_lines(imgs, mask):
+	"""Set line pixels to black unless they touch a non-line white pixel.
+
+	imgs is a single (height, width) image or an (N, height, width) stack.
+	"""
+	on = (imgs != 0) & ~mask
+	# 3x3 dilation of the white non-line pixels, done as two separable passes
+	pad = [(0, 0)] * (on.ndim - 2)
+	rows = np.pad(on, pad + [(0, 0), (1, 1)], 'constant')
+	rows = rows[..., :-2] | rows[..., 1:-1] | rows[..., 2:]
+	cols = np.pad(rows, pad + [(1, 1), (0, 0)], 'constant')
+	touch = cols[..., :-2, :] | cols[..., 1:-1, :] | cols[..., 2:, :]
+	return np.where(mask & ~touch, 0, imgs).astype(imgs.dtype)
+
+
+def letter_runs(img):
+	"""Return the start and end columns of the runs wider than three columns."""
+	occupied = np.concatenate([[0], np.any(img != 0, axis=0), [0]])
+	edges = np.diff(occupied.astype('int8'))
+	starts = np.flatnonzero(edges == 1)
+	ends = np.flatnonzero(edges == -1)
+	wide = ends - starts > 3
+	return starts[wide], ends[wide]
+
+
+def split_columns(img):
+	"""Return the [start, end) column range of each of the 4 letters.
+
+	Columns containing a white pixel form runs; runs of three columns or
+	fewer are noise. While there are too many runs the two neighbours with
+	the smallest combined width are merged, and while there are too few the
+	widest run is split around its middle column.
+	"""
+	starts, ends = letter_runs(img)
+
+	while len(starts) > num_letters:
+		widths = ends - starts
+		i = np.argmin(widths[:-1] + widths[1:])
+		starts = np.delete(starts, i + 1)
+		ends = np.delete(ends, i)
+
+	while 0 < len(starts) < num_letters:
+		i = np.argmax(ends - starts)
+		middle = starts[i] + (ends[i] - starts[i] - 1) // 2
+		starts = np.insert(starts, i + 1, middle + 1)
+		ends = np.insert(ends, i, middle)
+
+	return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _tagged_columns(img):
+	"""Return split_columns(img) and the candidates of alternative_columns
+	before filtering, as (columns, pair) where pair is the first of the two
+	letters whose split point was moved, or None for a regrouping of runs."""
+	columns = split_columns(img)
+	if len(columns) != num_letters:
+		return columns, []
+	tagged = []
+
+	starts, ends = letter_runs(img)
+	if num_letters < len(starts) <= max_runs:
+		for cuts in itertools.combinations(range(1, len(starts)), num_letters - 1):
+			bounds = (0,) + cuts + (len(starts),)
+			tagged.append(([(starts[bounds[i]], ends[bounds[i + 1] - 1])
+				for i in range(num_letters)], None))
+
+	for i in range(num_letters - 1):
+		if columns[i + 1][0] - columns[i][1] > 1:
+			continue
+		for shift in split_shifts:
+			moved = list(columns)
+			moved[i] = (columns[i][0], columns[i][1] + shift)
+			moved[i + 1] = (columns[i + 1][0] + shift, columns[i + 1][1])
+			if moved[i][1] - moved[i][0] > 3 and moved[i + 1][1] - moved[i + 1][0] > 3:
+				tagged.append((moved, i))
+
+	return columns, [([(int(start), int(end)) for start, end in candidate], pair)
+		for candidate, pair in tagged]
+
+
+def _pick_columns(columns, tagged, weak=None):
+	"""The distinct candidates of tagged other than columns, in order,
+	leaving out moved split points that are not next to a weak letter."""
+	unique = []
+	for candidate, pair in tagged:
+		if pair is not None and weak is not None and not (weak[pair] or weak[pair + 1]):
+			continue
+		if candidate != columns and candidate not in unique:
+			unique.append(candidate)
+	return unique
+
+
+def alternative_columns(img, weak=None):
+	"""Return other plausible column ranges for the letters of img.
+
+	Candidates group the projection runs into 4 letters differently from
+	split_columns, and move each split point between two touching letters
+	by a few columns. If weak (a boolean per letter) is given, only split
+	points next to a weak letter are moved.
+	"""
+	columns, tagged = _tagged_columns(img)
+	return _pick_columns(columns, tagged, weak)
+
+
+def letter_masks(img, columns):
+	"""Return a (4, height, width) stack with one letter's columns kept in each."""
+	masks = np.zeros((num_letters,) + img.shape, dtype=bool)
+	for i, (start, end) in enumerate(columns):
+		masks[i, :, start:end] = img[:, start:end] != 0
+	return masks
+
+
+def component_masks(img):
+	"""Return a (4, height, width) stack with one connected letter in each.
+
+	White pixels are labelled into 8-connected components. Components of
+	fewer than min_component pixels are noise, and components that share
+	most of their columns, such as the dot of an i or a letter broken by
+	line removal, are merged; as with projection runs, letters no more than
+	three columns wide are dropped. Returns None unless exactly 4 letters
+	remain, e.g. when two letters touch.
+	"""
+	count, labels, stats, centroids = cv2.connectedComponentsWithStats(
+		(img != 0).astype('uint8'), connectivity=8)
+	keep = np.flatnonzero(stats[:, cv2.CC_STAT_AREA] >= min_component)
+	keep = keep[keep > 0]
+	keep = keep[np.argsort(stats[keep, cv2.CC_STAT_LEFT], kind='stable')]
+	lefts = stats[keep, cv2.CC_STAT_LEFT]
+	rights = lefts + stats[keep, cv2.CC_STAT_WIDTH]
+	groups = []
+	for i, left, right in zip(keep.tolist(), lefts.tolist(), rights.tolist()):
+		if groups:
+			last = groups[-1]
+			overlap = min(right, last[1]) - max(left, last[0])
+			if 2 * overlap > min(right - left, last[1] - last[0]):
+				last[1] = max(last[1], right)
+				last[2].append(i)
+				continue
+		groups.append([left, right, [i]])
+	groups = [group for group in groups if group[1] - group[0] > 3]
+	if len(groups) != num_letters:
+		return None
+
+	letter_of = np.zeros(count, dtype='int8')
+	for j, (left, right, members) in enumerate(groups):
+		letter_of[members] = j + 1
+	return letter_of[labels] == np.arange(1, num_letters + 1)[:, None, None]
+
+
+def segment_letters(img, method='projection'):
+	"""Return the (4, height, width) letter masks of a cleaned CAPTCHA.
+
+	method is one of segmentation_methods: 'projection' splits the columns
+	with split_columns, 'components' uses component_masks and falls back to
+	projection for CAPTCHAs whose letters touch or are broken.
+	"""
+	if method == 'components':
+		masks = component_masks(img)
+		if masks is not None:
+			return masks
+	elif method != 'projection':
+		raise ValueError('unknown segmentation method ' + repr(method))
+	return letter_masks(img, split_columns(img))
+
+
+def center_crop(masks, crops=1):
+	"""Cut 32x32 windows centred on the centre of mass of each letter mask.
+
+	masks is an (N, height, width) stack; returns (N, 32, 32) float32 of 0s
+	and 1s. The centre is computed in the coordinates of the letter trimmed
+	to its bounding rows and padded by 30 pixels, as the original list code
+	did, so that ties round the same way. Blank masks give blank letters.
+
+	With crops > 1, the windows at the first crops crop_offsets from the
+	centre are cut for every mask, giving (N * crops, 32, 32) with the crops
+	of each mask next to each other.
+	"""
+	if not 1 <= crops <= len(crop_offsets):
+		raise ValueError('crops must be between 1 and %d' % len(crop_offsets))
+	n, h, w = masks.shape
+	count = masks.sum(axis=(1, 2))
+	found = count > 0
+	top = np.argmax(masks.any(axis=2), axis=1)
+	left = np.argmax(masks.any(axis=1), axis=1)
+	row_sum = masks.sum(axis=2).dot(np.arange(h))
+	col_sum = masks.sum(axis=1).dot(np.arange(w))
+	pad = 30
+	safe = np.maximum(count, 1)
+	y = np.rint((row_sum + (pad - top) * count) / safe - 15.5).astype(int)
+	x = np.rint((col_sum + (pad - left) * count) / safe - 15.5).astype(int)
+	y = np.where(found, y - pad + top, 0) + letter_size
+	x = np.where(found, x - pad + left, 0) + letter_size
+	offsets = np.array(crop_offsets[:crops])
+	y = (y[:, None] + offsets[:, 0]).ravel()
+	x = (x[:, None] + offsets[:, 1]).ravel()
+	padded = np.pad(masks, ((0, 0), (letter_size, letter_size),
+		(letter_size, letter_size)), 'constant')
+	window = np.arange(letter_size)
+	letters = padded[np.repeat(np.arange(n), crops)[:, None, None],
+		(y[:, None] + window)[:, :, None], (x[:, None] + window)[:, None, :]]
+	letters[~np.repeat(found, crops)] = 0
+	return letters.astype('float32')
+
+
+def extract_letters(img, method='projection'):
+	"""Return the letters of a cleaned CAPTCHA as (4, 32, 32).
+
+	Letters that cannot be found are left blank.
+	"""
+	return center_crop(segment_letters(img, method))
+
+
+def predict_letters(model, letters, crops=1):
+	"""Predict a (N*4, 32, 32) stack of letters with a single model call.
+
+	Returns (N, 4, 36) class probabilities; blank letters get all zeros.
+	With crops > 1, letters holds that many crops of every letter, as made
+	by center_crop, and their probabilities are averaged.
+	"""
+	classes = model.predict(
+		letters.reshape((-1, letter_size, letter_size, 1)),
+		batch_size=min(len(letters), predict_batch_size))
+	blank = ~np.any(letters.reshape((len(classes), -1)), axis=1)
+	classes[blank] = 0
+	classes = classes.reshape((-1, num_letters, crops, classes.shape[-1]))
+	return classes.mean(axis=2)
+
+
+def predict_whole(model, imgs):
+	"""Predict (N, 50, 100) cleaned CAPTCHAs with a sequence model.
+
+	Returns (N, 4, 36) class probabilities from the model's four heads.
+	The images are shaped to the model's input, channels first or last.
+	"""
+	x = (imgs != 0).astype('float32').reshape(
+		(-1,) + tuple(model.input_shape[1:]))
+	classes = model.predict(x, batch_size=min(len(x), predict_batch_size))
+	return np.stack(classes, axis=1)
+
+
+def read_probs(probs):
+	"""Return (text, confidence) for each (4, 36) row of probs: the most
+	likely letters and the probability of the least certain of them."""
+	index = np.argmax(probs, axis=2)
+	val = np.min(np.max(probs, axis=2), axis=1)
+	return [("".join(letter_saves[j] for j in index[i]), float(val[i]))
+		for i in range(len(index))]
+
+
+def accept(text, confidence):
+	"""The solution text if confidence reaches min_confidence, else None."""
+	return text if confidence >= min_confidence else None
+
+
+def decide(probs):
+	"""Return the solution for each (4, 36) row of probs, or None where a
+	letter falls below min_confidence."""
+	return [accept(text, confidence) for text, confidence in read_probs(probs)]
+
+
+def classify(model, letters):
+	"""Return the solution of every CAPTCHA in a (N*4, 32, 32) stack."""
+	return decide(predict_letters(model, letters))
+
+
+# A CAPTCHA that failed the first pass, kept with its cleaned image and the
+# (4, 36) letter probabilities of the rejected segmentation.
+Rejected = collections.namedtuple('Rejected', ['name', 'img', 'probs'])
+
+
+def second_pass(model, rejected, crops=1, cuts=None):
+	"""Re-solve rejected CAPTCHAs using alternative segmentations.
+
+	The letters of every candidate segmentation of every rejected CAPTCHA
+	are predicted in one batch, and each CAPTCHA takes the candidate whose
+	weakest letter is the most confident, with crops test-time crops per
+	letter. Returns (text, confidence) of that candidate, or None where there
+	was none, for each entry of rejected.
+
+	With cuts, a list of min_confidence values, a list holding that result
+	under each cut is returned per entry instead, None for the cuts the
+	CAPTCHA already meets. Candidates shared by several cuts are read once.
+	"""
+	picks = []
+	masks = []
+	for item in rejected:
+		columns, tagged = _tagged_columns(item.img)
+		certainty = np.max(item.probs, axis=1)
+		found = {}
+		pick = []
+		for cut in (cuts or [min_confidence]):
+			chosen = []
+			if certainty.min() < cut:
+				for candidate in _pick_columns(columns, tagged, certainty < cut):
+					key = tuple(candidate)
+					if key not in found:
+						found[key] = len(masks)
+						masks.append(letter_masks(item.img, candidate))
+					chosen.append(found[key])
+			pick.append(chosen)
+		picks.append(pick)
+	readings = []
+	if masks:
+		readings = read_probs(predict_letters(model,
+			center_crop(np.concatenate(masks), crops), crops))
+
+	results = []
+	for pick in picks:
+		best = []
+		for chosen in pick:
+			candidate = None
+			for j in chosen:
+				if candidate is None or readings[j][1] > candidate[1]:
+					candidate = readings[j]
+			best.append(candidate)
+		results.append(best if cuts is not None else best[0])
+	return results
+
+
+def prepare_batch(batch, mask, segment=True, segmentation='projection',
+		crops=1):
+	"""Decode, clean and segment a list of (name, img_data) pairs.
+
+	Returns the names, the cleaned images and a (len(batch) * 4 * crops,
+	32, 32) stack of letters, found with the segmentation method of
+	segment_letters, or None for the letters if segment is not set.
+	"""
+	names = [name for name, img_data in batch]
+	if not batch:
+		return (names, np.zeros((0, height, width), dtype='uint8'),
+			np.zeros((0, letter_size, letter_size), dtype='float32'))
+	imgs = remove_lines(np.array([decode(img_data)
+		for name, img_data in batch]), mask)
+	if not segment:
+		return names, imgs, None
+	letters = center_crop(np.concatenate([segment_letters(img, segmentation)
+		for img in imgs]), crops)
+	return names, imgs, letters
+
+
+def score_batch(model, names, imgs, letters, retry=True, whole=False,
+		cuts=None):
+	"""Classify a prepared batch, retrying rejected CAPTCHAs if retry is set.
+
+	With whole set, model is a sequence model that reads the cleaned
+	CAPTCHAs themselves, and letters and retry are ignored. Otherwise the
+	number of test-time crops per letter is taken from the size of letters.
+
+	Returns (text, confidence) for every CAPTCHA in input order, where
+	confidence is the probability of its least certain letter. With cuts, a
+	list of min_confidence values, a list of the (text, confidence) under
+	each cut is returned per CAPTCHA instead, as if min_confidence had been
+	set to that cut; the retries of all cuts share one second pass.
+	"""
+	if not names:
+		return []
+	if whole:
+		scored = read_probs(predict_whole(model, imgs))
+	else:
+		crops = len(letters) // (len(names) * num_letters)
+		probs = predict_letters(model, letters, crops)
+		scored = read_probs(probs)
+	results = [[reading] * len(cuts or [min_confidence]) for reading in scored]
+	if retry and not whole:
+		top = max(cuts or [min_confidence])
+		queue = [i for i, (text, confidence) in enumerate(scored)
+			if confidence < top]
+		rejected = [Rejected(names[i], imgs[i], probs[i]) for i in queue]
+		for i, candidates in zip(queue,
+				second_pass(model, rejected, crops, cuts or [min_confidence])):
+			for j, candidate in enumerate(candidates):
+				if candidate is not None and candidate[1] > scored[i][1]:
+					results[i][j] = candidate
+	if cuts is None:
+		return [result[0] for result in results]
+	return results
+
+
+def resolve_batch(model, names, imgs, letters, retry=True, whole=False):
+	"""Classify a prepared batch, retrying rejected CAPTCHAs if retry is set.
+
+	Returns (name, solution) pairs in input order; solution is None for
+	CAPTCHAs that were rejected.
+	"""
+	return [(name, accept(text, confidence)) for name, (text, confidence)
+		in zip(names, score_batch(model, names, imgs, letters, retry, whole))]
+
+
+def solve_batch(model, batch, mask, retry=True, whole=False,
+		segmentation='projection', crops=1):
+	"""Solve a list of (name, img_data) pairs.
+
+	Returns (name, solution) pairs in input order; solution is None for
+	CAPTCHAs that were rejected.
+	"""
+	names, imgs, letters = prepare_batch(batch, mask, not whole, segmentation,
+		crops)
+	return resolve_batch(model, names, imgs, letters, retry, whole)
+
+
+def read_captchas(filename='cdata.csv', start=0, offsets=False):
+	"""Yield (name, img_data) pairs from a CAPTCHA dump.
+
+	Reading begins at byte offset start, which must be the start of a row.
+	With offsets set, (name, img_data, end) triples are yielded instead,
+	where end is the byte offset just after the row.
+	"""
+	with open(filename, 'rb') as f:
+		f.seek(start)
+		end = start
+		for line in f:
+			end += len(line)
+			line = line.rstrip(b'\r\n')
+			if not line:
+				continue
+			name, img_data = line.split(b',', 2)[:2]
+			if offsets:
+				yield name.decode('utf-8'), img_data, end
+			else:
+				yield name.decode('utf-8'), img_data
+
+
+def batches(captchas, batch_size):
+	"""Group an iterable of CAPTCHAs into lists of batch_size."""
+	batch = []
+	for captcha in captchas:
+		batch.append(captcha)
+		if len(batch) == batch_size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+
+_worker_mask = None
+
+def _init_worker(mask_file):
+	global _worker_mask
+	_worker_mask = line_mask(mask_file)
+
+def _prepare_worker(batch, segment, segmentation, crops):
+	return prepare_batch(batch, _worker_mask, segment, segmentation, crops)
+
+
+def _lookup(cache, batch):
+	"""Return the cache keys of batch, the cached results among them and
+	the CAPTCHAs that still have to be solved."""
+	if cache is None:
+		return None, None, batch
+	keys = [cache.key(img_data) for name, img_data in batch]
+	found = cache.get_many(keys)
+	misses = [captcha for captcha, key in zip(batch, keys) if key not in found]
+	return keys, found, misses
+
+
+def _merge(cache, batch, keys, found, scored, raw=False):
+	"""Yield (name, solution) for batch from its cached results and the
+	(text, confidence) of the misses, which are added to the cache. With raw
+	set, (name, result) is yielded instead, result as score_batch gave it."""
+	if cache is not None:
+		missed = [key for key in keys if key not in found]
+		cache.put_many(zip(missed, scored))
+		found.update(zip(missed, scored))
+		scored = [found[key] for key in keys]
+	for (name, img_data), result in zip(batch, scored):
+		if raw:
+			yield name, result
+		else:
+			yield name, accept(*result)
+
+
+def solve(model, captchas, mask_file='clines.csv', processes=None,
+		batch_size=256, retry=True, whole=False, cache=None,
+		segmentation='projection', crops=1, cuts=None):
+	"""Yield (name, solution) for every CAPTCHA, in input order.
+
+	Batches of CAPTCHAs are decoded, cleaned and segmented on a pool of
+	processes (one per core by default) while this process runs a single
+	batched prediction per batch, plus one for the second pass over the
+	batch's rejected CAPTCHAs when retry is set. At most two batches per
+	worker are in flight so that large inputs are streamed rather than read
+	up front. With whole set, model is a sequence model that classifies
+	whole cleaned CAPTCHAs and segmentation is skipped; otherwise letters
+	are found with the given method of segment_letters, and with crops > 1
+	the probabilities of that many shifted crops of each letter are averaged
+	before min_confidence is applied.
+
+	If a ResultCache is given, CAPTCHAs whose img_data is already in it are
+	answered from the cache without any image work, and the results of the
+	others are added to it.
+
+	With cuts, a list of min_confidence values, (name, readings) is yielded
+	instead, where readings holds the (text, confidence) the solver gives
+	with min_confidence set to each cut: text is the best reading whether or
+	not it was accepted and confidence the probability of its least certain
+	letter. Such results are not cached.
+	"""
+	if cuts is not None and cache is not None:
+		raise ValueError('per-cut readings cannot be cached')
+	if processes == 1:
+		mask = line_mask(mask_file)
+		for batch in batches(captchas, batch_size):
+			keys, found, misses = _lookup(cache, batch)
+			prepared = prepare_batch(misses, mask, not whole, segmentation,
+				crops)
+			results = score_batch(model, *prepared, retry=retry, whole=whole,
+				cuts=cuts)
+			for result in _merge(cache, batch, keys, found, results,
+					cuts is not None):
+				yield result
+		return
+
+	processes = processes or multiprocessing.cpu_count()
+	pool = multiprocessing.Pool(processes, _init_worker, (mask_file,))
+	pending = collections.deque()
+
+	def finish():
+		batch, keys, found, prepared = pending.popleft()
+		results = score_batch(model, *prepared.get(), retry=retry, whole=whole,
+			cuts=cuts)
+		return _merge(cache, batch, keys, found, results, cuts is not None)
+
+	try:
+		for batch in batches(captchas, batch_size):
+			keys, found, misses = _lookup(cache, batch)
+			pending.append((batch, keys, found,
+				pool.apply_async(_prepare_worker,
+					(misses, not whole, segmentation, crops))))
+			if len(pending) < 2 * processes:
+				continue
+			for result in finish():
+				yield result
+		while pending:
+			for result in finish():
+				yield result
+	finally:
+		pool.terminate()
+		pool.join()
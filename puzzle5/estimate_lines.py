@@ -0,0 +1,133 @@
+# Estimate the positions of the noise lines from a sample of CAPTCHAs. The
+# lines are drawn at the same place on every CAPTCHA of a user, so a pixel
+# that is white in most thresholded images belongs to a line; letters move
+# around and no letter pixel comes close. A line pixel missing from the
+# mask is worse than an extra one: remove_lines keeps line pixels that touch
+# other white pixels, so it takes the line pixels around it along. Pixels
+# next to a line pixel are therefore taken at a lower frequency. Writes
+# clines.csv for the cleaner, after comparing the cleaned images with those
+# of the mask it replaces.
+#
+#   python3 estimate_lines.py --input cdata.csv --output clines.csv
+
+from __future__ import print_function
+import argparse
+import base64
+import csv
+import itertools
+import os
+
+import numpy as np
+
+import engine
+import ingest
+
+
+def white_frequency(imgs, batch_size=1024):
+	"""Return the fraction of images in which each pixel is white.
+
+	imgs is an iterable of binary images; they are summed a batch at a time
+	so only batch_size images are held in memory.
+	"""
+	imgs = iter(imgs)
+	counts = np.zeros((engine.height, engine.width), dtype='uint32')
+	total = 0
+	while True:
+		batch = list(itertools.islice(imgs, batch_size))
+		if not batch:
+			break
+		counts += np.count_nonzero(np.array(batch), axis=0).astype('uint32')
+		total += len(batch)
+	if total == 0:
+		raise ValueError('no images to estimate the lines from')
+	return counts / float(total)
+
+
+def line_pixels(frequency, threshold=0.6, neighbour_threshold=0.4):
+	"""Return the boolean mask of the line pixels for a white_frequency.
+
+	Pixels white in at least threshold of the images are line pixels, and
+	so are their 8-neighbours that are white in at least
+	neighbour_threshold of them.
+	"""
+	core = frequency >= threshold
+	rows = np.pad(core, [(0, 0), (1, 1)], 'constant')
+	rows = rows[:, :-2] | rows[:, 1:-1] | rows[:, 2:]
+	cols = np.pad(rows, [(1, 1), (0, 0)], 'constant')
+	near = cols[:-2] | cols[1:-1] | cols[2:]
+	return core | (near & (frequency >= neighbour_threshold))
+
+
+def compare_masks(imgs, old, new):
+	"""Count the images that the two line masks clean differently.
+
+	Returns the number of images, those whose cleaned pixels differ and
+	those whose letters split_columns finds at other columns.
+	"""
+	total = cleaned = splits = 0
+	for img in imgs:
+		a = engine.remove_lines(img, old)
+		b = engine.remove_lines(img, new)
+		total += 1
+		if np.array_equal(a, b):
+			continue
+		cleaned += 1
+		if engine.split_columns(a) != engine.split_columns(b):
+			splits += 1
+	return total, cleaned, splits
+
+
+def write_lines(mask, filename='clines.csv'):
+	"""Write the pixels of a boolean mask as the x,y rows read_lines expects."""
+	ys, xs = np.nonzero(mask)
+	with open(filename, 'w', newline='') as csvfile:
+		spamwriter = csv.writer(csvfile, delimiter=' ', quotechar='|')
+		for x, y in sorted(zip(xs.tolist(), ys.tolist())):
+			spamwriter.writerow(['%d,%d' % (x, y)])
+
+
+def sample_images(filename, limit):
+	"""Yield up to limit decoded CAPTCHAs from a CSV, JSON or JSONL dump."""
+	if filename.endswith('.csv'):
+		jpegs = (base64.decodebytes(img_data)
+			for name, img_data in engine.read_captchas(filename))
+	else:
+		jpegs = (jpeg_bytes for name, jpeg_bytes in ingest.iter_images(filename))
+	for jpeg_bytes in itertools.islice(jpegs, limit):
+		yield engine.decode_jpeg(jpeg_bytes)
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='Estimate the noise line pixels of a CAPTCHA dump.')
+	parser.add_argument('--input', default='cdata.csv')
+	parser.add_argument('--output', default='clines.csv')
+	parser.add_argument('--limit', type=int, default=10000,
+		help='number of CAPTCHAs to sample')
+	parser.add_argument('--threshold', type=float, default=0.6,
+		help='fraction of CAPTCHAs in which a line pixel is white')
+	parser.add_argument('--neighbour-threshold', type=float, default=0.4,
+		help='fraction for the pixels next to a line pixel')
+	parser.add_argument('--previous', default=None,
+		help='mask to compare the cleaned images with (default: OUTPUT)')
+	parser.add_argument('--compare', type=int, default=1000,
+		help='number of CAPTCHAs cleaned with both masks (0 to skip)')
+	args = parser.parse_args()
+
+	mask = line_pixels(white_frequency(sample_images(args.input, args.limit)),
+		args.threshold, args.neighbour_threshold)
+	previous = args.previous or args.output
+	if args.compare and os.path.exists(previous):
+		old = engine.line_mask(previous)
+		total, cleaned, splits = compare_masks(
+			sample_images(args.input, args.compare), old, mask)
+		print('Against %s (%d pixels, %d missing, %d extra): cleaned images '
+			'differ on %d of %d CAPTCHAs, letter splits on %d'
+			% (previous, old.sum(), (old & ~mask).sum(), (mask & ~old).sum(),
+			cleaned, total, splits))
+	write_lines(mask, args.output)
+	print('Wrote', int(mask.sum()), 'line pixels to', args.output)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,182 @@
+# Scores the automatic solver against the manually labelled CAPTCHAs of
+# solved.csv (or a LabelStore directory). The labels are streamed through
+# the batched solver, which reports the best reading and confidence it
+# would give under each requested min_confidence cut-off (the second pass
+# depends on the cut-off too, so each is replayed exactly), so one run gives
+# the per-letter and whole-CAPTCHA accuracy at the configured cut-off, the
+# letter confusion matrix, the throughput, and the coverage and precision
+# of every cut-off.
+#
+#   python3 evaluate.py --labels solved.csv --output evaluation.json
+
+from __future__ import print_function
+import argparse
+import base64
+import csv
+import json
+import time
+
+import numpy as np
+
+import engine
+import ingest
+
+thresholds = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+def labelled_captchas(source, truth):
+	"""Yield (name, img_data) for the labelled CAPTCHAs in source.
+
+	The label of every CAPTCHA yielded is appended to truth. Labels that are
+	not four known characters are skipped.
+	"""
+	for name, solution, jpeg_bytes in ingest.read_labelled(source):
+		if (len(solution) != engine.num_letters
+				or any(c not in engine.letter_saves for c in solution)):
+			continue
+		truth.append(solution)
+		yield name, base64.b64encode(jpeg_bytes)
+
+
+def score(readings, truth, cuts=thresholds, at=engine.min_confidence):
+	"""Accuracy figures for the solver's readings of labelled CAPTCHAs.
+
+	readings holds for every CAPTCHA the (text, confidence) under each of
+	cuts, as engine.solve yields them, and truth the labels. Accuracy and
+	the confusion matrix are those of the readings under the cut at, which
+	must be one of cuts. Returns a dict of results and the confusion matrix,
+	with the labels as rows and the predicted letters as columns, in the
+	order of letter_saves.
+	"""
+	cuts = list(cuts)
+	texts = [reading[cuts.index(at)][0] for reading in readings]
+	index = dict((c, i) for i, c in enumerate(engine.letter_saves))
+	classes = len(engine.letter_saves)
+	confusion = np.zeros((classes, classes), dtype=int)
+	for text, label in zip(texts, truth):
+		for predicted, actual in zip(text, label):
+			confusion[index[actual], index[predicted]] += 1
+	correct = np.array([text == label for text, label in zip(texts, truth)],
+		dtype=bool)
+	letters = confusion.sum(axis=1)
+
+	results = {
+		'captchas': len(truth),
+		'captcha_accuracy': float(correct.mean()) if len(truth) else None,
+		'letter_accuracy': float(np.trace(confusion)) / max(letters.sum(), 1),
+		'letter_recall': dict((c, float(confusion[i, i]) / letters[i])
+			for c, i in index.items() if letters[i]),
+		'thresholds': [],
+	}
+	for k, cut in enumerate(cuts):
+		accepted = np.array([reading[k][1] >= cut for reading in readings],
+			dtype=bool)
+		right = np.array([reading[k][0] == label
+			for reading, label in zip(readings, truth)], dtype=bool)
+		results['thresholds'].append({
+			'threshold': cut,
+			'accepted': int(accepted.sum()),
+			'correct': int((accepted & right).sum()),
+			'coverage': float(accepted.mean()) if len(truth) else None,
+			'precision': float(right[accepted].mean())
+				if accepted.any() else None,
+		})
+	return results, confusion
+
+
+def write_confusion(confusion, filename):
+	"""Write the confusion matrix as CSV with the letters as headers."""
+	with open(filename, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['label'] + engine.letter_saves)
+		for c, row in zip(engine.letter_saves, confusion):
+			writer.writerow([c] + row.tolist())
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='Score the solver against manually labelled CAPTCHAs.')
+	parser.add_argument('--labels', default='solved.csv',
+		help='solved.csv or a LabelStore directory')
+	parser.add_argument('--lines', default='clines.csv')
+	parser.add_argument('--model', default=None,
+		help='default: trained_model.hdf5, or sequence_model.hdf5 with --whole')
+	parser.add_argument('--weights', default=None,
+		help='default: trained_weights.hdf5, none with --whole')
+	parser.add_argument('--quantized', default=None,
+		help='int8 model written by quantize.py, run with NumPy only')
+	parser.add_argument('--whole', action='store_true',
+		help='classify whole CAPTCHAs with a sequence model (no segmentation)')
+	parser.add_argument('--segmentation', default='projection',
+		choices=engine.segmentation_methods)
+	parser.add_argument('--crops', type=int, default=1,
+		help='average the predictions of this many shifted crops per letter')
+	parser.add_argument('--no-retry', dest='retry', action='store_false',
+		help='skip the second pass over rejected CAPTCHAs')
+	parser.add_argument('--processes', type=int, default=None,
+		help='worker processes for decoding (default: one per core)')
+	parser.add_argument('--batch-size', type=int, default=256)
+	parser.add_argument('--thresholds', type=float, nargs='+',
+		default=sorted(set(thresholds + (engine.min_confidence,))))
+	parser.add_argument('--confusion', default='confusion.csv')
+	parser.add_argument('--output', default='evaluation.json')
+	args = parser.parse_args()
+	if args.quantized and args.whole:
+		parser.error('--quantized only supports the letter classifier')
+
+	if args.quantized:
+		from quantize import QuantizedModel
+		model = QuantizedModel(args.quantized)
+	else:
+		from inference import load_inference_model
+		if args.whole:
+			model = load_inference_model(args.model or 'sequence_model.hdf5',
+				args.weights)
+		else:
+			model = load_inference_model(args.model or 'trained_model.hdf5',
+				args.weights or 'trained_weights.hdf5')
+	print("Loaded model from disk")
+
+	cuts = sorted(set(args.thresholds + [engine.min_confidence]))
+	truth = []
+	readings = []
+	start = time.perf_counter()
+	for name, reading in engine.solve(
+			model, labelled_captchas(args.labels, truth), args.lines,
+			args.processes, args.batch_size, args.retry, args.whole,
+			segmentation=args.segmentation, crops=args.crops, cuts=cuts):
+		readings.append(reading)
+	seconds = time.perf_counter() - start
+
+	results, confusion = score(readings, truth, cuts)
+	results['seconds'] = seconds
+	results['images_per_second'] = len(truth) / seconds if seconds else None
+	results['settings'] = {
+		'labels': args.labels,
+		'model': args.quantized or args.model,
+		'whole': args.whole,
+		'segmentation': args.segmentation,
+		'crops': args.crops,
+		'retry': args.retry,
+	}
+
+	print('%d CAPTCHAs in %.1f s (%.1f images/s)'
+		% (len(truth), seconds, results['images_per_second'] or 0))
+	print('Whole-CAPTCHA accuracy: %.4f' % (results['captcha_accuracy'] or 0))
+	print('Letter accuracy:        %.4f' % results['letter_accuracy'])
+	print('threshold  accepted  coverage  precision')
+	for row in results['thresholds']:
+		print('%9.2f  %8d  %8.4f  %9s' % (row['threshold'], row['accepted'],
+			row['coverage'] or 0, '-' if row['precision'] is None
+			else '%.4f' % row['precision']))
+	worst = sorted(results['letter_recall'].items(), key=lambda item: item[1])
+	print('Weakest letters:', ', '.join('%s %.3f' % item for item in worst[:5]))
+
+	write_confusion(confusion, args.confusion)
+	with open(args.output, 'w') as f:
+		json.dump(results, f, indent=2, sort_keys=True)
+	print('Wrote', args.output, 'and', args.confusion)
+
+
+if __name__ == '__main__':
+	main()
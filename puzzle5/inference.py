@@ -0,0 +1,75 @@
+# Inference-only loading of the CAPTCHA models. Skips the optimizer state
+# and compilation, builds only the predict function, and caches the model as
+# its JSON architecture plus a NumPy archive of weights so that later starts
+# do not parse HDF5 at all. The archive records which model and weights files
+# it was built from and is rebuilt when they differ.
+
+from __future__ import print_function
+import os
+
+import numpy as np
+from keras.models import load_model, model_from_json
+
+from cache import file_fingerprint
+
+
+def _is_fresh(cache, sources):
+	if not os.path.exists(cache):
+		return False
+	with np.load(cache) as archive:
+		return ('sources' in archive.files
+			and str(archive['sources']) == sources)
+
+
+def _build_predict_function(model):
+	if not model.built:
+		model.build()
+	# Sequential models wrap an internal functional Model
+	inner = getattr(model, 'model', None) or model
+	inner._make_predict_function()
+	return model
+
+
+def save_cache(model, cache, sources=''):
+	"""Store the architecture and weights of model in a .npz file.
+
+	sources identifies the files the model was loaded from.
+	"""
+	tmp = cache + '.tmp.npz'
+	np.savez(tmp, config=np.array(model.to_json()),
+		sources=np.array(sources), *model.get_weights())
+	os.replace(tmp, cache)
+
+
+def load_cache(cache):
+	"""Rebuild a model stored by save_cache."""
+	with np.load(cache) as archive:
+		model = model_from_json(str(archive['config']))
+		count = sum(name.startswith('arr_') for name in archive.files)
+		model.set_weights([archive['arr_%d' % i] for i in range(count)])
+	return model
+
+
+def load_inference_model(filename='trained_model.hdf5',
+		weights='trained_weights.hdf5', cache=True):
+	"""Load a model for prediction only.
+
+	The model in filename is loaded without its optimizer and, if weights is
+	given, its weights are replaced by those in that file. The result is
+	written to cache (by default filename with a .npz extension) together
+	with the paths, sizes and mtimes of both files, and reused only while
+	they match, so loading other weights rebuilds it. Pass cache=None to
+	always read the HDF5 files.
+	"""
+	if cache is True:
+		cache = os.path.splitext(filename)[0] + '.npz'
+	sources = file_fingerprint(filename, weights)
+	if cache and _is_fresh(cache, sources):
+		model = load_cache(cache)
+	else:
+		model = load_model(filename, compile=False)
+		if weights:
+			model.load_weights(weights)
+		if cache:
+			save_cache(model, cache, sources)
+	return _build_predict_function(model)
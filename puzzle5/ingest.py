@@ -0,0 +1,155 @@
+# Streaming CAPTCHA ingestion and a content-addressed store of labelled
+# CAPTCHAs.
+#
+# iter_images reads {"images": [{"name": ..., "jpg_base64": ...}, ...]} dumps
+# (or JSONL files with one such object per line) a chunk at a time, so
+# memory does not grow with the size of the dump. LabelStore keeps each
+# JPEG once, under the SHA-1 of its bytes, and records name, solution and
+# digest in a small CSV.
+
+from __future__ import print_function
+import base64
+import csv
+import hashlib
+import json
+import os
+import re
+
+_skip = re.compile(r'[\s,]*')
+
+
+def _iter_json_array(f, key, chunk_size=1 << 16):
+	"""Yield the items of the array under key, reading f a chunk at a time."""
+	decoder = json.JSONDecoder()
+	buf = ''
+	pos = -1
+	token = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+	while pos < 0:
+		more = f.read(chunk_size)
+		if not more:
+			raise ValueError('no "%s" array found' % key)
+		buf += more
+		match = token.search(buf)
+		if match:
+			pos = match.end()
+		else:
+			# keep enough of the tail to match a token split across chunks
+			buf = buf[-(len(key) + 64):]
+
+	while True:
+		pos = _skip.match(buf, pos).end()
+		if pos < len(buf) and buf[pos] == ']':
+			return
+		try:
+			item, end = decoder.raw_decode(buf, pos)
+		except ValueError:
+			more = f.read(chunk_size)
+			if not more:
+				raise
+			buf = buf[pos:] + more
+			pos = 0
+			continue
+		yield item
+		pos = end
+		if pos > chunk_size:
+			buf = buf[pos:]
+			pos = 0
+
+
+def iter_records(filename, key='images'):
+	"""Yield the image objects of a JSON dump or a JSONL file lazily."""
+	with open(filename, 'r') as f:
+		if filename.endswith('.jsonl'):
+			for line in f:
+				if line.strip():
+					yield json.loads(line)
+		else:
+			for item in _iter_json_array(f, key):
+				yield item
+
+
+def iter_images(filename, key='images'):
+	"""Yield (name, jpeg_bytes) for every image of a JSON or JSONL dump."""
+	for item in iter_records(filename, key):
+		yield item['name'], base64.b64decode(item['jpg_base64'])
+
+
+def read_solved_csv(filename='solved.csv'):
+	"""Yield (name, solution, jpeg_bytes) from manual_solver's old CSV, which
+	holds each CAPTCHA as three rows: name, solution and base64 JPEG."""
+	with open(filename, 'r') as csvfile:
+		rows = (row[0] for row in csv.reader(csvfile) if row)
+		for name, solution, img_data in zip(rows, rows, rows):
+			yield name, solution, base64.b64decode(img_data)
+
+
+class LabelStore(object):
+	"""Labelled CAPTCHAs with every distinct image stored once.
+
+	root/labels.csv holds name,solution,digest rows and root/images holds
+	the JPEGs named by the SHA-1 digest of their bytes.
+	"""
+
+	def __init__(self, root='labelled'):
+		self.root = root
+		self.labels = os.path.join(root, 'labels.csv')
+		self.images = os.path.join(root, 'images')
+		if not os.path.isdir(self.images):
+			os.makedirs(self.images)
+
+	def image_path(self, digest):
+		return os.path.join(self.images, digest + '.jpg')
+
+	def put_image(self, jpeg_bytes):
+		"""Store an image unless it is already present; return its digest."""
+		digest = hashlib.sha1(jpeg_bytes).hexdigest()
+		path = self.image_path(digest)
+		if not os.path.exists(path):
+			tmp = path + '.%d.tmp' % os.getpid()
+			with open(tmp, 'wb') as fp:
+				fp.write(jpeg_bytes)
+			os.replace(tmp, path)
+		return digest
+
+	def add(self, name, solution, jpeg_bytes):
+		digest = self.put_image(jpeg_bytes)
+		with open(self.labels, 'a') as output_file:
+			csv.writer(output_file).writerow([name, solution, digest])
+		return digest
+
+	def __iter__(self):
+		"""Yield (name, solution, digest) for every label."""
+		if not os.path.exists(self.labels):
+			return
+		with open(self.labels, 'r') as csvfile:
+			for row in csv.reader(csvfile):
+				if row:
+					yield row[0], row[1], row[2]
+
+	def read_image(self, digest):
+		with open(self.image_path(digest), 'rb') as fp:
+			return fp.read()
+
+	def items(self):
+		"""Yield (name, solution, jpeg_bytes) for every label."""
+		for name, solution, digest in self:
+			yield name, solution, self.read_image(digest)
+
+
+def read_labelled(source='solved.csv'):
+	"""Yield (name, solution, jpeg_bytes) from an old CSV or a LabelStore."""
+	if os.path.isdir(source):
+		return LabelStore(source).items()
+	return read_solved_csv(source)
+
+
+if __name__ == '__main__':
+	# Move the labels of solved.csv into the store
+	import sys
+	source = sys.argv[1] if len(sys.argv) > 1 else 'solved.csv'
+	store = LabelStore(sys.argv[2] if len(sys.argv) > 2 else 'labelled')
+	count = 0
+	for name, solution, jpeg_bytes in read_solved_csv(source):
+		store.add(name, solution, jpeg_bytes)
+		count += 1
+	print('Imported', count, 'labels into', store.root)
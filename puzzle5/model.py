@@ -10,96 +10,84 @@ from keras.models import Sequential
 from keras.layers import Dense, Dropout, Flatten
 from keras.layers import Conv2D, MaxPooling2D
 from keras import backend as K
-import numpy as np
-import csv
+
+import augment
+import dataset
 
 batch_size = 3400
 num_classes = 36
 epochs = 120
+workers = 4
 
 # input image dimensions
 img_rows, img_cols = 32, 32
 
-# load training set
-x_train = []
-y_train = [] # stores category of pictures
-with open('formatted.csv', 'r') as csvfile:
-  spamreader = csv.reader(csvfile, delimiter=',', quotechar='|')
-  for row in spamreader:
-    y_train.append(int(row[0]))
-    turned_to_int = np.array(row[1:]).astype(int)
-    result = np.reshape(turned_to_int, (32, 32))
-    x_train.append(result)
-x_train= np.array(x_train)
-y_train = np.array(y_train)
-
-# load test set
-x_test = []
-y_test = [] # stores category of pictures
-with open('test.csv', 'r') as csvfile:
-  spamreader = csv.reader(csvfile, delimiter=',', quotechar='|')
-  for row in spamreader:
-    y_test.append(int(row[0]))
-    turned_to_int = np.array(row[1:]).astype(int)
-    result = np.reshape(turned_to_int, (32, 32))
-    x_test.append(result)
-x_test = np.array(x_test)
-y_test = np.array(y_test)
-
-print('x_train shape:', x_train.shape)
-print('y_train shape:', y_train.shape)
-print(x_train.shape[0], 'train samples')
-print(x_test.shape[0], 'test samples')
-
-if K.image_data_format() == 'channels_first':
-    x_train = x_train.reshape(x_train.shape[0], 1, img_rows, img_cols)
-    x_test = x_test.reshape(x_test.shape[0], 1, img_rows, img_cols)
-    input_shape = (1, img_rows, img_cols)
-else:
-    x_train = x_train.reshape(x_train.shape[0], img_rows, img_cols, 1)
-    x_test = x_test.reshape(x_test.shape[0], img_rows, img_cols, 1)
-    input_shape = (img_rows, img_cols, 1)
-
-x_train = x_train.astype('float32')
-x_test = x_test.astype('float32')
-x_train /= 255
-x_test /= 255
-print('x_train shape:', x_train.shape)
-print('y_train shape:', y_train.shape)
-print(x_train.shape[0], 'train samples')
-print(x_test.shape[0], 'test samples')
-
-# convert class vectors to binary class matrices
-y_train = keras.utils.to_categorical(y_train, num_classes)
-y_test = keras.utils.to_categorical(y_test, num_classes)
-
-model = Sequential()
-model.add(Conv2D(32, kernel_size=(3, 3),
-                 activation='relu',
-                 input_shape=input_shape))
-model.add(Conv2D(64, (3, 3), activation='relu'))
-model.add(MaxPooling2D(pool_size=(2, 2)))
-model.add(Dropout(0.25))
-model.add(Flatten())
-model.add(Dense(128, activation='relu'))
-model.add(Dropout(0.5))
-model.add(Dense(num_classes, activation='softmax'))
-
-model.compile(loss=keras.losses.categorical_crossentropy,
-              optimizer=keras.optimizers.Adadelta(),
-              metrics=['accuracy'])
-
-model.fit(x_train, y_train,
-          batch_size=batch_size,
-          epochs=epochs,
-          verbose=1,
-          validation_data=(x_test, y_test))
-
-# Save trained model
-model.save('trained_model1.hdf5')
-model.save_weights('trained_weights1.hdf5')
-print("Saved trained model")
-
-score = model.evaluate(x_test, y_test, verbose=0)
-print("Test loss: ", score[0])
-print("Test accuracy: ", score[1])
\ No newline at end of file
+
+def get_input_shape():
+    if K.image_data_format() == 'channels_first':
+        return (1, img_rows, img_cols)
+    return (img_rows, img_cols, 1)
+
+
+def build_model(input_shape=None):
+    """The 36-way letter classifier, uncompiled."""
+    model = Sequential()
+    model.add(Conv2D(32, kernel_size=(3, 3),
+                     activation='relu',
+                     input_shape=input_shape or get_input_shape()))
+    model.add(Conv2D(64, (3, 3), activation='relu'))
+    model.add(MaxPooling2D(pool_size=(2, 2)))
+    model.add(Dropout(0.25))
+    model.add(Flatten())
+    model.add(Dense(128, activation='relu'))
+    model.add(Dropout(0.5))
+    model.add(Dense(num_classes, activation='softmax'))
+    return model
+
+
+def main():
+    input_shape = get_input_shape()
+
+    # training batches are read from the packed file and augmented on the fly
+    train = augment.LetterSequence(dataset.ensure_packed('formatted.csv'),
+                                   batch_size=batch_size,
+                                   num_classes=num_classes,
+                                   input_shape=input_shape)
+
+    # load the test set as a view of its packed .npy file
+    x_test, y_test = dataset.load_dataset('test.csv')
+    x_test = x_test.reshape((x_test.shape[0],) + input_shape)
+    x_test = x_test.astype('float32')
+    x_test /= 255
+    print(len(train.order), 'train samples')
+    print(x_test.shape[0], 'test samples')
+
+    # convert class vectors to binary class matrices
+    y_test = keras.utils.to_categorical(y_test, num_classes)
+
+    model = build_model(input_shape)
+
+    model.compile(loss=keras.losses.categorical_crossentropy,
+                  optimizer=keras.optimizers.Adadelta(),
+                  metrics=['accuracy'])
+
+    model.fit_generator(train,
+                        steps_per_epoch=len(train),
+                        epochs=epochs,
+                        verbose=1,
+                        validation_data=(x_test, y_test),
+                        workers=workers,
+                        use_multiprocessing=True)
+
+    # Save trained model
+    model.save('trained_model1.hdf5')
+    model.save_weights('trained_weights1.hdf5')
+    print("Saved trained model")
+
+    score = model.evaluate(x_test, y_test, verbose=0)
+    print("Test loss: ", score[0])
+    print("Test accuracy: ", score[1])
+
+
+if __name__ == '__main__':
+    main()
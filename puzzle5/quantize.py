@@ -0,0 +1,194 @@
+# Int8 export of the letter classifier and a NumPy-only runner for it. The
+# export step stores every Conv2D and Dense kernel as int8 with one float
+# scale per output channel, next to the float biases and the layer list, in
+# a single .npz. QuantizedModel reads that file without Keras or a backend
+# session and has the same predict() as a Keras model, so it can be handed
+# to engine.solve directly.
+#
+#   python3 quantize.py --model trained_model.hdf5 \
+#       --weights trained_weights.hdf5 --output trained_model.int8.npz
+
+from __future__ import print_function
+import argparse
+import json
+import os
+
+import numpy as np
+
+# the im2col buffer of the second convolution is ~0.9 MB per letter
+predict_batch_size = 128
+
+
+def quantize_kernel(kernel):
+	"""Symmetric int8 quantization with one scale per output channel.
+
+	kernel's last axis is the output channel, as in Keras Conv2D and Dense
+	kernels. Returns the int8 kernel and the float32 scales, such that
+	kernel ~= q * scale.
+	"""
+	amax = np.max(np.abs(kernel.reshape((-1, kernel.shape[-1]))), axis=0)
+	scale = np.where(amax > 0, amax / 127.0, 1.0).astype('float32')
+	q = np.clip(np.rint(kernel / scale), -127, 127).astype('int8')
+	return q, scale
+
+
+def export(model, filename):
+	"""Write the int8 version of a Sequential Keras model to filename.
+
+	Only the layers of the letter classifier are supported: Conv2D with
+	stride 1, MaxPooling2D, Flatten, Dense and Dropout (which is dropped),
+	all channels_last.
+	"""
+	layers = []
+	arrays = {}
+	for layer in model.layers:
+		kind = type(layer).__name__
+		config = layer.get_config()
+		if config.get('data_format', 'channels_last') != 'channels_last':
+			raise ValueError('%s: only channels_last is supported' % layer.name)
+		if kind in ('InputLayer', 'Dropout'):
+			continue
+		if kind in ('Conv2D', 'Dense'):
+			if kind == 'Conv2D' and tuple(config['strides']) != (1, 1):
+				raise ValueError('%s: only stride 1 is supported' % layer.name)
+			weights = layer.get_weights()
+			q, scale = quantize_kernel(weights[0])
+			i = len(layers)
+			arrays['kernel_%d' % i] = q
+			arrays['scale_%d' % i] = scale
+			arrays['bias_%d' % i] = (weights[1] if len(weights) > 1
+				else np.zeros(q.shape[-1])).astype('float32')
+			layers.append({'type': kind, 'activation': config['activation'],
+				'padding': config.get('padding', 'valid')})
+		elif kind == 'MaxPooling2D':
+			if (config['padding'] != 'valid'
+					or tuple(config['strides']) != tuple(config['pool_size'])):
+				raise ValueError('%s: only non-overlapping valid pooling is '
+					'supported' % layer.name)
+			layers.append({'type': kind, 'pool_size': list(config['pool_size'])})
+		elif kind == 'Flatten':
+			layers.append({'type': kind})
+		else:
+			raise ValueError('%s: unsupported layer %s' % (layer.name, kind))
+
+	tmp = filename + '.tmp.npz'
+	np.savez(tmp, layers=np.array(json.dumps(layers)), **arrays)
+	os.replace(tmp, filename)
+
+
+def _activate(x, activation):
+	if activation == 'relu':
+		return np.maximum(x, 0, out=x)
+	if activation == 'softmax':
+		x -= np.max(x, axis=-1, keepdims=True)
+		np.exp(x, out=x)
+		x /= np.sum(x, axis=-1, keepdims=True)
+		return x
+	if activation == 'linear':
+		return x
+	raise ValueError('unsupported activation ' + activation)
+
+
+def _conv2d(x, kernel, bias, padding):
+	"""Stride-1 convolution of a (N, H, W, C) batch as a single matmul.
+
+	The kh * kw shifted views of x are stacked along the channel axis
+	(im2col), which matches the (kh, kw, C, out) layout of the kernel.
+	"""
+	kh, kw, c, filters = kernel.shape
+	if padding == 'same':
+		x = np.pad(x, ((0, 0), ((kh - 1) // 2, kh // 2),
+			((kw - 1) // 2, kw // 2), (0, 0)))
+	n, h, w = x.shape[:3]
+	oh, ow = h - kh + 1, w - kw + 1
+	patches = np.concatenate([x[:, i:i + oh, j:j + ow]
+		for i in range(kh) for j in range(kw)], axis=-1)
+	out = np.dot(patches.reshape((-1, kh * kw * c)),
+		kernel.reshape((-1, filters)))
+	out += bias
+	return out.reshape((n, oh, ow, filters))
+
+
+def _max_pool(x, pool_size):
+	ph, pw = pool_size
+	n, h, w, c = x.shape
+	h, w = h // ph * ph, w // pw * pw
+	return x[:, :h, :w].reshape((n, h // ph, ph, w // pw, pw, c)).max(axis=(2, 4))
+
+
+class QuantizedModel(object):
+	"""Run a model written by export with NumPy only.
+
+	The int8 kernels are what is stored and loaded; they are expanded to
+	float32 once, per output channel, so that scoring runs on the BLAS
+	matrix products NumPy has (it has none for int8).
+	"""
+
+	def __init__(self, filename):
+		with np.load(filename) as archive:
+			self.layers = json.loads(str(archive['layers']))
+			self.weights = {}
+			for i, layer in enumerate(self.layers):
+				if layer['type'] in ('Conv2D', 'Dense'):
+					self.weights[i] = (
+						archive['kernel_%d' % i] * archive['scale_%d' % i],
+						archive['bias_%d' % i])
+
+	def _forward(self, x):
+		for i, layer in enumerate(self.layers):
+			kind = layer['type']
+			if kind == 'Conv2D':
+				x = _conv2d(x, self.weights[i][0], self.weights[i][1],
+					layer['padding'])
+			elif kind == 'Dense':
+				x = np.dot(x, self.weights[i][0]) + self.weights[i][1]
+			elif kind == 'MaxPooling2D':
+				x = _max_pool(x, layer['pool_size'])
+			elif kind == 'Flatten':
+				x = x.reshape((len(x), int(np.prod(x.shape[1:]))))
+			if 'activation' in layer:
+				x = _activate(x, layer['activation'])
+		return x
+
+	def predict(self, x, batch_size=predict_batch_size):
+		"""Class probabilities for a (N, H, W, C) batch of inputs.
+
+		Inputs are run at most predict_batch_size at a time whatever
+		batch_size asks for, to bound the im2col buffers.
+		"""
+		x = np.asarray(x, dtype='float32')
+		batch_size = min(batch_size or predict_batch_size, predict_batch_size)
+		return np.concatenate([self._forward(x[i:i + batch_size])
+			for i in range(0, max(len(x), 1), batch_size)])
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='Export the letter classifier with int8 weights.')
+	parser.add_argument('--model', default='trained_model.hdf5')
+	parser.add_argument('--weights', default='trained_weights.hdf5')
+	parser.add_argument('--output', default=None,
+		help='default: MODEL with .int8.npz')
+	parser.add_argument('--test', default='test.csv',
+		help='letters to compare both models on (empty to skip)')
+	args = parser.parse_args()
+	output = args.output or os.path.splitext(args.model)[0] + '.int8.npz'
+
+	from inference import load_inference_model
+	model = load_inference_model(args.model, args.weights or None, cache=None)
+	export(model, output)
+	print("Wrote", output)
+
+	if args.test:
+		import dataset
+		x, y = dataset.load_dataset(args.test)
+		x = x.reshape((len(x),) + model.input_shape[1:]).astype('float32') / 255
+		expected = model.predict(x)
+		actual = QuantizedModel(output).predict(x)
+		print("Max probability difference:", np.max(np.abs(expected - actual)))
+		print("Float accuracy:", np.mean(np.argmax(expected, axis=1) == y))
+		print("Int8 accuracy: ", np.mean(np.argmax(actual, axis=1) == y))
+
+
+if __name__ == '__main__':
+	main()
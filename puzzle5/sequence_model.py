@@ -0,0 +1,101 @@
+'''Trains a convnet that reads a whole cleaned CAPTCHA and predicts its four
+letters with four softmax heads, so solving needs no segmentation and one
+forward pass per CAPTCHA. Trained from the manually labelled CAPTCHAs.
+
+    python3 sequence_model.py --labels solved.csv
+'''
+
+from __future__ import print_function
+import argparse
+
+import keras
+from keras.engine.topology import Input
+from keras.layers import Conv2D, Dense, Dropout, Flatten, MaxPooling2D
+from keras.models import Model
+from keras import backend as K
+import numpy as np
+
+import engine
+import ingest
+
+batch_size = 64
+epochs = 60
+num_classes = len(engine.letter_saves)
+
+
+def get_input_shape():
+    if K.image_data_format() == 'channels_first':
+        return (1, engine.height, engine.width)
+    return (engine.height, engine.width, 1)
+
+
+def build_sequence_model(input_shape=None):
+    """Shared convolutional trunk with one 36-way softmax head per letter."""
+    captcha = Input(shape=input_shape or get_input_shape(), name='captcha')
+    x = Conv2D(32, (3, 3), activation='relu', padding='same')(captcha)
+    x = MaxPooling2D(pool_size=(2, 2))(x)
+    x = Conv2D(64, (3, 3), activation='relu', padding='same')(x)
+    x = MaxPooling2D(pool_size=(2, 2))(x)
+    x = Conv2D(64, (3, 3), activation='relu', padding='same')(x)
+    x = MaxPooling2D(pool_size=(2, 2))(x)
+    x = Dropout(0.25)(x)
+    x = Flatten()(x)
+    x = Dense(256, activation='relu')(x)
+    x = Dropout(0.5)(x)
+    letters = [Dense(num_classes, activation='softmax', name='letter%d' % i)(x)
+               for i in range(engine.num_letters)]
+    return Model(inputs=captcha, outputs=letters)
+
+
+def load_labelled_set(source='solved.csv', lines='clines.csv'):
+    """Cleaned CAPTCHAs and one one-hot array per letter position.
+
+    Labels that are not four known characters are skipped.
+    """
+    mask = engine.line_mask(lines)
+    imgs = []
+    labels = []
+    for name, solution, jpeg_bytes in ingest.read_labelled(source):
+        if (len(solution) != engine.num_letters
+                or any(c not in engine.letter_saves for c in solution)):
+            continue
+        imgs.append(engine.decode_jpeg(jpeg_bytes))
+        labels.append([engine.letter_saves.index(c) for c in solution])
+    x = engine.remove_lines(np.array(imgs), mask) != 0
+    x = x.astype('float32').reshape((len(imgs),) + get_input_shape())
+    labels = np.array(labels)
+    y = [keras.utils.to_categorical(labels[:, i], num_classes)
+         for i in range(engine.num_letters)]
+    return x, y
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Train the whole-CAPTCHA sequence model.')
+    parser.add_argument('--labels', default='solved.csv',
+                        help='solved.csv or a LabelStore directory')
+    parser.add_argument('--lines', default='clines.csv')
+    parser.add_argument('--epochs', type=int, default=epochs)
+    parser.add_argument('--validation-split', type=float, default=0.1)
+    parser.add_argument('--output', default='sequence_model.hdf5')
+    args = parser.parse_args()
+
+    x, y = load_labelled_set(args.labels, args.lines)
+    print(x.shape[0], 'labelled CAPTCHAs')
+
+    model = build_sequence_model()
+    model.compile(loss='categorical_crossentropy',
+                  optimizer=keras.optimizers.Adadelta(),
+                  metrics=['accuracy'])
+    model.fit(x, y,
+              batch_size=batch_size,
+              epochs=args.epochs,
+              verbose=1,
+              validation_split=args.validation_split)
+
+    model.save(args.output)
+    print("Saved trained model to", args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Streaming writer for solved CAPTCHAs. Every solution is written as one
+# JSON record per line and flushed in batches, so a crash only loses the
+# last batch and other processes can tail the file while the solver runs.
+
+import hashlib
+import json
+import os
+
+# Input bytes before a checkpoint's offset that identify the input it
+# belongs to (a row is a few kilobytes of base64)
+digest_bytes = 1 << 16
+
+
+class SolutionWriter(object):
+	"""Append {"name": ..., "solution": ...} records to a JSONL file."""
+
+	def __init__(self, filename, flush_every=100, mode='w', count=0):
+		self.filename = filename
+		self.flush_every = flush_every
+		self.count = count
+		self._buffer = []
+		self._file = open(filename, mode)
+
+	def write(self, name, solution):
+		self._buffer.append(json.dumps({'name': name, 'solution': solution}))
+		self.count += 1
+		if len(self._buffer) >= self.flush_every:
+			self.flush()
+
+	def flush(self):
+		if self._buffer:
+			self._file.write('\n'.join(self._buffer) + '\n')
+			self._buffer = []
+		self._file.flush()
+		os.fsync(self._file.fileno())
+
+	def size(self):
+		"""Flush and return the size of the file in bytes."""
+		self.flush()
+		return os.fstat(self._file.fileno()).st_size
+
+	def close(self):
+		if not self._file.closed:
+			self.flush()
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def save_checkpoint(filename, **state):
+	"""Atomically replace filename with a JSON object of state."""
+	tmp = filename + '.tmp'
+	with open(tmp, 'w') as f:
+		json.dump(state, f)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp, filename)
+
+
+def input_digest(filename, offset):
+	"""Digest of the digest_bytes of filename that end at offset, or None
+	if the file is missing or shorter than offset."""
+	if not os.path.exists(filename) or os.path.getsize(filename) < offset:
+		return None
+	start = max(offset - digest_bytes, 0)
+	with open(filename, 'rb') as f:
+		f.seek(start)
+		return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def load_checkpoint(filename):
+	"""Return the state saved by save_checkpoint, or None if there is none."""
+	if not os.path.exists(filename):
+		return None
+	with open(filename, 'r') as f:
+		return json.load(f)
+
+
+def read_solutions(filename):
+	"""Yield the records of a JSONL file, skipping a torn last line."""
+	with open(filename, 'r') as f:
+		for line in f:
+			try:
+				yield json.loads(line)
+			except ValueError:
+				continue
+
+
+def write_document(records_file, output):
+	"""Write the {"solutions": [...]} document for a JSONL file atomically."""
+	tmp = output + '.tmp'
+	with open(tmp, 'w') as f:
+		f.write('{"solutions": [')
+		for i, record in enumerate(read_solutions(records_file)):
+			f.write((',\n' if i else '\n') + json.dumps(record))
+		f.write('\n]}\n')
+	os.replace(tmp, output)